@@ -1,19 +1,75 @@
-import asyncio, re, os, datetime, json
+import asyncio, re, os, datetime, json, functools, sqlite3, argparse, bisect
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from urllib.parse import urljoin, urlparse
 from pathlib import Path
+import httpx
 import pandas as pd
-from bs4 import BeautifulSoup
+import lxml.html
+from lxml import etree
 from playwright.async_api import async_playwright
 
+try:
+    import re2  # google-re2: linear-time DFA matching for the whole-page VIN scans
+except ImportError:
+    re2 = re
+
+try:
+    import uvloop  # libuv event loop: cheaper socket/callback handling for the concurrent fetches
+except ImportError:
+    uvloop = None
+
 # ----------------------------
 # Config
 # ----------------------------
 BASE = "https://www.carboxautosales.com"
 INV_URL = f"{BASE}/inventory/"
+SITEMAP_URLS = (f"{BASE}/sitemap.xml", f"{BASE}/sitemap_inventory.xml")
 
-VIN_RE   = re.compile(r"\b([A-HJ-NPR-Z0-9]{17})\b")
+VIN_RE   = re2.compile(r"\b([A-HJ-NPR-Z0-9]{17})\b")
+VIN_SCAN_RE = re2.compile(r"[A-HJ-NPR-Z0-9]{17}")  # boundary-free superset of VIN_RE: cheap "any candidate?" gate
 YEAR_RE  = re.compile(r"\b(19|20)\d{2}\b")
-PRICE_RE = re.compile(r"\$?\s*([0-9]{1,3}(?:,[0-9]{3})+|[0-9]+)(?:\.[0-9]{2})?")  # $12,345 or 12345
+PRICE_RE = re.compile(r"\$?\s*([0-9]{1,3}(?:,[0-9]{3})+|[0-9]+)(?:\.[0-9]{2})?")  # $12,345 or 12345; stdlib re: called per short value, where re2 call overhead dominates
+MAKE_RE  = re.compile(r"\bMAKE\s+([A-Z0-9\-\s]+)")
+MODEL_RE = re.compile(r"\bMODEL\s+([A-Z0-9\-\s]+)")
+JSON_VIN_RE   = re2.compile(rb'"([A-HJ-NPR-Z0-9]{17})"')                      # a JSON string value that is exactly a VIN
+JSON_PRICE_RE = re2.compile(rb'"\w*[Pp]rice"\s*:\s*"?\$?\s*([0-9][0-9,]*)')  # "price": 12345 / "salePrice": "$12,345"
+SITEMAP_LOC_RE = re2.compile(r"<loc>\s*([^<\s]+)\s*</loc>")
+LISTING_ID_RE = re.compile(r"/(\d{4,})/?$")  # trailing stock/listing number of a detail URL
+SPEC_WORD_RE = re2.compile(r"(?i)specifications")  # raw-source gate for the SPEC_XPATH tree scan
+VIN_JSONLD_KEYS = frozenset({"vin", "vehicleidentificationnumber"})  # lower-cased JSON-LD keys that hold the VIN
+NEXT_TEXT_RE = re.compile(r"next|older|>", re.I)  # JS pagination controls without an href
+
+# Compiled once; extract_specs_from_html runs these on every detail page
+TEXT_XPATH      = etree.XPath(".//text()[normalize-space()][not(ancestor::script or ancestor::style)]")
+LDJSON_XPATH    = etree.XPath("//script[contains(translate(@type, 'LDJSON', 'ldjson'), 'ld+json')]/text()")
+CANONICAL_XPATH = etree.XPath("//link[@rel='canonical']/@href")
+SPEC_XPATH      = etree.XPath(
+    "//*[text()[contains(translate(., 'specifications', 'SPECIFICATIONS'), 'SPECIFICATIONS')]]"
+)
+
+# Plain-HTTP fetches look like a normal browser; CDNs often serve a bot wall to "python-httpx/x.y"
+HTTP_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/129.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+MAX_PER_HOST       = max(1, int(os.environ.get("CARBOX_CONCURRENCY") or 6))  # politeness cap: requests in flight against the dealer site at once
+STATIC_CONNECTIONS = MAX_PER_HOST  # plain-HTTP fetches in flight for detail pages
+LISTING_TABS       = MAX_PER_HOST  # listing pages loading at once in the crawl context
+DETAIL_WORKERS     = MAX_PER_HOST  # concurrent browser contexts for JS-only pages
+SPECS_CACHE        = Path("reports/.cache/specs.sqlite")  # static-path specs + validators, reused across daily runs
+SPECS_CACHE_DAYS   = 14  # rows not fetched or revalidated for this long (sold cars) are dropped
+PARSE_WORKERS      = os.cpu_count() or 1  # processes running extract_specs_from_html off the event loop
+CHROMIUM_ARGS      = ["--disable-dev-shm-usage"]  # CI containers ship a tiny /dev/shm; renderers crash once it fills
+BLOCKED_RESOURCES  = {"image", "font", "media", "stylesheet", "other"}  # never read by the extractor
+# analytics/ad hosts: nothing we need, and their beacons keep the network busy
+BLOCKED_HOSTS = (
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net", "googlesyndication.com",
+    "facebook.net", "facebook.com", "hotjar.com", "clarity.ms", "bat.bing.com",
+)
 
 # ----------------------------
 # Utilities
@@ -30,53 +86,118 @@ def _clean_price(val: str) -> str:
     except Exception:
         return ""
 
+async def _block_heavy_resources(route):
+    """Route handler: abort requests we never read (photos, fonts, CSS, trackers) to cut bytes per page."""
+    req = route.request
+    host = urlparse(req.url).hostname or ""
+    if req.resource_type in BLOCKED_RESOURCES or host.endswith(BLOCKED_HOSTS):
+        await route.abort()
+    else:
+        await route.continue_()
+
 # ----------------------------
 # HTML parsing helpers
 # ----------------------------
-def extract_specs_from_html(html: str, url_hint: str = "") -> dict:
-    """Pull Year/Make/Model/VIN/Price from DOM text + JSON-LD, with URL-based fallbacks."""
-    soup = BeautifulSoup(html, "html.parser")
-    text = soup.get_text(" ", strip=True)
-
-    # --- VIN & price from JSON-LD if present
-    vin = None
-    price = ""
-    for tag in soup.find_all("script", type=lambda t: t and "ld+json" in t.lower()):
-        try:
-            data = json.loads(tag.string or "")
-        except Exception:
+def _parse_html(html: str):
+    """lxml document for `html`; empty input yields an empty document instead of raising."""
+    if not html or not html.strip():
+        html = "<html></html>"
+    try:
+        return lxml.html.document_fromstring(html)
+    except ValueError:
+        # str input that still carries an <?xml encoding=...?> declaration
+        return lxml.html.document_fromstring(html.encode("utf-8"))
+    except etree.ParserError:
+        return lxml.html.document_fromstring("<html></html>")
+
+def _text_of(el) -> str:
+    """Equivalent of BeautifulSoup's get_text(" ", strip=True): visible strings only, no script/style."""
+    return " ".join(s.strip() for s in TEXT_XPATH(el))
+
+@functools.lru_cache(maxsize=1024)
+def _load_ldjson(raw: str):
+    """json.loads for one JSON-LD block (None if invalid). Memoized: dealer-wide blocks such as
+    Organization/AutoDealer are byte-identical on every detail page."""
+    try:
+        return json.loads(raw)
+    except Exception:
+        return None
+
+def _find_vin_price(data) -> tuple:
+    """(vin, price) from parsed JSON-LD.
+
+    Keyed fields ("vin"/"vehicleIdentificationNumber", "price") are taken as-is and end the
+    walk as soon as both are found; otherwise fall back to the first string value that looks
+    like a VIN / a price. The walk is in document order, so the page's own vehicle (the first
+    block) wins over "similar vehicles" blocks further down.
+    """
+    vin = price = ""
+    vin_guess = price_guess = ""
+    stack = [data]
+    while stack:
+        cur = stack.pop()
+        if isinstance(cur, list):
+            stack.extend(reversed(cur))  # LIFO: reversed so the first element is visited first
             continue
-        stack = [data]
-        while stack:
-            cur = stack.pop()
-            if isinstance(cur, dict):
-                # offers.price is common
-                if "offers" in cur and isinstance(cur["offers"], (dict, list)):
-                    stack.append(cur["offers"])
-                for _, v in cur.items():
-                    if isinstance(v, (dict, list)):
-                        stack.append(v)
-                    elif isinstance(v, str):
-                        s = v.strip()
-                        if not vin and VIN_RE.fullmatch(s):
-                            vin = s.upper()
-                        if not price:
-                            p = _clean_price(s)
-                            if p:
-                                price = p
-            elif isinstance(cur, list):
-                stack.extend(cur)
-
-    # --- Fallback: VIN/price from visible text
-    if not vin:
-        m = VIN_RE.search(text)
-        if m:
-            vin = m.group(1).upper()
-    if not price:
-        price = _clean_price(text)
+        if not isinstance(cur, dict):
+            continue
+        children = []
+        for k, v in cur.items():
+            if isinstance(v, (dict, list)):
+                children.append(v)
+                continue
+            if v is None or isinstance(v, bool):
+                continue
+            key = k.lower() if isinstance(k, str) else ""
+            if key in VIN_JSONLD_KEYS:
+                s = str(v).strip().upper()
+                if not vin and len(s) == 17:
+                    vin = s
+            elif key == "price":
+                if not price:
+                    price = _clean_price(str(v))
+            elif isinstance(v, str):
+                s = v.strip()
+                # cheap length check first: almost no JSON-LD string is 17 chars long
+                if not vin_guess and len(s) == 17 and VIN_RE.fullmatch(s):
+                    vin_guess = s.upper()
+                elif not price_guess:
+                    price_guess = _clean_price(s)
+        if vin and price:
+            break
+        stack.extend(reversed(children))
+    return vin or vin_guess, price or price_guess
+
+def extract_specs_from_html(html: str, url_hint: str = "", extra_text: str = None, require_vin: bool = False) -> dict:
+    """Pull Year/Make/Model/VIN/Price from DOM text + JSON-LD, with URL-based fallbacks.
+
+    `extra_text` is already-rendered page text (e.g. document.body.innerText); when given it is
+    scanned instead of re-deriving the visible text from the tree.
+    With `require_vin`, a page whose raw source has no VIN-shaped token at all is returned empty
+    without building a DOM (its row would be dropped anyway).
+    """
+    if require_vin and not extra_text and not VIN_SCAN_RE.search(html or ""):
+        return {"year": "", "make": "", "model": "", "vin": "", "price": "", "url": url_hint or ""}
+
+    tree = _parse_html(html)
+
+    # --- VIN & price from JSON-LD if present (all blocks walked together, see _find_vin_price)
+    # str(): lxml's smart strings reference their tree, which must not end up as a cache key
+    docs = [d for d in (_load_ldjson(str(raw)) for raw in LDJSON_XPATH(tree)) if d is not None]
+    vin, price = _find_vin_price(docs)
+
+    # --- Fallback: VIN/price from visible text (only materialized when JSON-LD fell short)
+    if not vin or not price:
+        text = extra_text or _text_of(tree)
+        if not vin:
+            m = VIN_RE.search(text)
+            if m:
+                vin = m.group(1).upper()
+        if not price:
+            price = _clean_price(text)
 
     # --- Year / Make / Model
-    title = (soup.title.string if soup.title else "").strip()
+    title = (tree.findtext(".//title") or "").strip()
     year = ""
     ym = YEAR_RE.search((title or "").upper())
     if ym:
@@ -87,9 +208,9 @@ def extract_specs_from_html(html: str, url_hint: str = "") -> dict:
 
     # URL-based fallback for make/model (common dealer URL pattern)
     url = url_hint or ""
-    canonical = soup.find("link", rel="canonical")
-    if canonical and canonical.get("href"):
-        url = canonical["href"]
+    canonical = CANONICAL_XPATH(tree)
+    if canonical and canonical[0]:
+        url = canonical[0]
 
     if url and "/inventory/" in url:
         tail = url.split("/inventory/", 1)[-1].strip("/")
@@ -98,23 +219,22 @@ def extract_specs_from_html(html: str, url_hint: str = "") -> dict:
             make = parts[0].upper()
             model = parts[1].upper()
 
-    # SPECIFICATIONS block (if platform exposes it)
-    spec_block = soup.find(string=re.compile(r"SPECIFICATIONS", re.I))
+    # SPECIFICATIONS block (if platform exposes it); skipped when title + URL already gave everything,
+    # and the tree-wide XPath only runs when the raw source mentions the keyword at all
+    spec_block = SPEC_XPATH(tree) if not (year and make and model) and SPEC_WORD_RE.search(html or "") else None
     if spec_block:
-        blk = spec_block.find_parent()
-        if blk:
-            blk_text = blk.get_text(" ", strip=True).upper()
-            ym2 = YEAR_RE.search(blk_text)
-            if ym2:
-                year = ym2.group(0)
-            if not make:
-                m_mk = re.search(r"\bMAKE\s+([A-Z0-9\-\s]+)", blk_text)
-                if m_mk:
-                    make = m_mk.group(1).strip()
-            if not model:
-                m_md = re.search(r"\bMODEL\s+([A-Z0-9\-\s]+)", blk_text)
-                if m_md:
-                    model = m_md.group(1).strip()
+        blk_text = _text_of(spec_block[0]).upper()
+        ym2 = YEAR_RE.search(blk_text)
+        if ym2:
+            year = ym2.group(0)
+        if not make:
+            m_mk = MAKE_RE.search(blk_text)
+            if m_mk:
+                make = m_mk.group(1).strip()
+        if not model:
+            m_md = MODEL_RE.search(blk_text)
+            if m_md:
+                model = m_md.group(1).strip()
 
     return {
         "year":  year or "",
@@ -125,182 +245,462 @@ def extract_specs_from_html(html: str, url_hint: str = "") -> dict:
         "url":   url or url_hint or ""
     }
 
+async def _parse_off_loop(pool, html: str, **kwargs) -> dict:
+    """extract_specs_from_html run in `pool` (None: the loop's default executor) so fetches keep flowing."""
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(pool, functools.partial(extract_specs_from_html, html, **kwargs))
+    except BrokenProcessPool:
+        # a worker died (e.g. OOM-killed) and the pool is unusable: parse inline rather than lose every later page
+        return extract_specs_from_html(html, **kwargs)
+
 # ----------------------------
 # Listing page crawling (handles 12-per-page pagination)
 # ----------------------------
-async def collect_vehicle_urls(playwright) -> list:
-    """Return a de-duped list of vehicle detail URLs across ALL inventory pages."""
-    browser = await playwright.chromium.launch()
+# Jump to the bottom (triggers lazy-load) and report how many inventory anchors exist so far
+SCROLL_AND_COUNT_JS = """() => {
+    window.scrollTo(0, document.body.scrollHeight);
+    return document.querySelectorAll('a[href*="/inventory/"]').length;
+}"""
+# True once a vehicle card link (/inventory/<make>/<model>/<id>/) is on the page; nav links to
+# /inventory/ itself don't count
+DETAIL_LINKS_READY_JS = """() => Array.from(document.querySelectorAll('a[href*="/inventory/"]'))
+    .some(a => /\\/inventory\\/[^\\/?#]+\\/[^\\/?#]+\\/[^\\/?#]+/.test(a.href))"""
+# True once the grid holds more inventory anchors than the count passed in
+MORE_ITEMS_JS = """n => document.querySelectorAll('a[href*="/inventory/"]').length > n"""
+# Every anchor on a listing page in one page.evaluate; vehicle links and pagination are both split out of it
+ANCHORS_JS = """() => Array.from(document.querySelectorAll('a[href]'), a => ({
+    href: a.href,
+    text: (a.innerText || '').trim(),
+    rel: a.getAttribute('rel') || '',
+    label: a.getAttribute('aria-label') || '',
+}))"""
+
+def _vehicle_url(href: str) -> str:
+    """`href` without query/fragment if it is a same-site vehicle detail page, else ""."""
+    # plain prefix test: same-site /inventory/ links only; then the detail shape, which rules out the
+    # listing root (a "?page=N" link strips down to it), /page/N/ and make/model landing pages
+    if not href.startswith(INV_URL):
+        return ""
+    url = href.split("?", 1)[0].split("#", 1)[0]
+    return url if _is_detail_url(url) else ""
+
+def _dedupe_by_listing_id(urls: list) -> list:
+    """Drop alias paths such as /featured/ID/ when a /make/model/ID/ URL for the same ID is also listed.
+
+    The trailing number is not unique across cars (on this site it is the VIN's last 6 characters),
+    so two /make/model/ID/ URLs are never merged; the VIN de-dupe after fetching covers true repeats.
+    """
+    detail_ids = set()
+    for u in urls:
+        m = LISTING_ID_RE.search(u)
+        if m and _is_detail_url(u):
+            detail_ids.add(m.group(1))
+    keep = []
+    for u in urls:
+        m = LISTING_ID_RE.search(u)
+        if _is_detail_url(u) or not m or m.group(1) not in detail_ids:
+            keep.append(u)
+    return sorted(set(keep))
+
+def _is_detail_url(url: str) -> bool:
+    """True for /inventory/<make>/<model>/<id>/-shaped URLs; landing, category and /page/N/ URLs are shorter."""
+    path = urlparse(url).path
+    return path.startswith("/inventory/") and len(path[len("/inventory/"):].strip("/").split("/")) >= 3
+
+def _same_page(final_url: str, requested: str) -> bool:
+    """False when a detail URL ended up somewhere else (a sold car's page redirecting to /inventory/)."""
+    return final_url.split("?", 1)[0].split("#", 1)[0].rstrip("/") == requested.rstrip("/")
+
+async def fetch_sitemap_urls() -> list:
+    """Vehicle detail URLs from the dealer's sitemap(s), following one level of sitemap index; [] if none."""
+    found = set()
+    async with httpx.AsyncClient(http2=True, timeout=20, headers=HTTP_HEADERS, follow_redirects=True) as client:
+        queue, seen = list(SITEMAP_URLS), set()
+        while queue and len(seen) < 20:
+            sitemap = queue.pop(0)
+            if sitemap in seen:
+                continue
+            seen.add(sitemap)
+            try:
+                resp = await client.get(sitemap)
+                resp.raise_for_status()
+            except httpx.HTTPError:
+                continue
+            for loc in SITEMAP_LOC_RE.findall(resp.text):
+                loc = loc.replace("&amp;", "&")
+                if loc.endswith(".xml") and loc.startswith(BASE):
+                    queue.append(loc)  # <sitemapindex> entry
+                elif _vehicle_url(loc):
+                    found.add(_vehicle_url(loc))
+    return sorted(found)
+
+async def collect_vehicle_urls(browser, stop_after_first_page=None) -> list:
+    """Return a de-duped list of vehicle detail URLs across ALL inventory pages.
+
+    `stop_after_first_page(links)` is asked once the first listing page is harvested; if it returns
+    True the crawl ends there and just that page's links are returned.
+    """
+    # listing tabs share one context (cookies, cache, connections); each tab loads its own page in parallel
+    context = await browser.new_context()
     try:
-        page = await browser.new_page()
-
-        async def harvest_vehicle_links_on_page() -> set:
-            urls = set()
-            anchors = await page.locator("a[href*='/inventory/']").all()
-            for a in anchors:
-                href = await a.get_attribute("href")
+        await context.route("**/*", _block_heavy_resources)
+        page = await context.new_page()
+
+        async def harvest_listing_page(page) -> tuple:
+            # (vehicle detail URLs, pagination URLs) from one anchor snapshot of the current page
+            urls, found = set(), set()
+            for a in await page.evaluate(ANCHORS_JS):
+                href, text = a["href"], a["text"]
                 if not href:
                     continue
                 href = urljoin(BASE, href)
-                if href.rstrip("/") in {BASE + "/inventory", BASE + "/inventory/"}:
-                    continue
-                urls.add(href.split("?")[0].split("#")[0])
-            return urls
-
-        async def discover_next_pages() -> list:
-            found = set()
-            sel = "a[rel='next'], a[aria-label*='Next' i], a:has-text('Next'), a:has-text('›'), a:has-text('»')"
-            for a in await page.locator(sel).all():
-                href = await a.get_attribute("href")
-                if href:
-                    found.add(urljoin(BASE, href))
-            # numbered pages (1..N)
-            for a in await page.locator("a").all():
+                vehicle = _vehicle_url(href)
+                if vehicle:
+                    urls.add(vehicle)
+                # rel=next / aria-label "Next" / "Next", "›", "»" link text, or numbered pages (1..N)
+                is_next = (
+                    "next" in a["rel"].lower().split()
+                    or "next" in a["label"].lower()
+                    or "next" in text.lower()
+                    or "›" in text
+                    or "»" in text
+                )
+                if is_next or text.isdigit():
+                    found.add(href.split("#")[0])
+            return urls, sorted(found)
+
+        async def open_listing(page, url):
+            await page.goto(url, wait_until="domcontentloaded", timeout=60000)
+            try:
+                await page.wait_for_function(DETAIL_LINKS_READY_JS, timeout=10000)
+            except Exception:
+                pass  # empty/odd page: harvest whatever is there
+
+        async def load_lazy_items(page):
+            # lazy-loaded grid: scroll, then resume as soon as new cards appear; stop once a scroll
+            # brings nothing within the grace period (capped at 20 scrolls)
+            n = await page.evaluate(SCROLL_AND_COUNT_JS)
+            for _ in range(20):
                 try:
-                    text = (await a.inner_text() or "").strip()
+                    await page.wait_for_function(MORE_ITEMS_JS, arg=n, timeout=600)
                 except Exception:
-                    continue
-                if text.isdigit():
-                    href = await a.get_attribute("href")
-                    if href:
-                        found.add(urljoin(BASE, href))
-            return sorted(found)
-
-        # start with page 1
-        await page.goto(INV_URL, wait_until="networkidle")
+                    break
+                n = await page.evaluate(SCROLL_AND_COUNT_JS)
+
         all_vehicle_links = set()
         seen_listing_pages = set()
-        to_visit = [INV_URL]
-
-        # brute-force patterns up to 20 pages
-        for i in range(2, 21):
-            to_visit.append(f"{INV_URL}?page={i}")
-            to_visit.append(urljoin(INV_URL, f"page/{i}/"))
-
-        while to_visit:
-            url = to_visit.pop(0)
-            if url in seen_listing_pages:
-                continue
-            seen_listing_pages.add(url)
+        tabs = asyncio.Queue()  # idle listing tabs; a visit borrows one and hands it back
+        tabs.put_nowait(page)
+        n_tabs = 1
 
+        async def visit(url) -> list:
+            tab = await tabs.get()
             try:
-                await page.goto(url, wait_until="networkidle", timeout=60000)
+                await open_listing(tab, url)
+                await load_lazy_items(tab)
+                links, next_pages = await harvest_listing_page(tab)
             except Exception:
-                continue
-
-            for _ in range(6):
-                await page.mouse.wheel(0, 20000)
-                await page.wait_for_timeout(250)
-
-            all_vehicle_links |= await harvest_vehicle_links_on_page()
-
-            for nxt in await discover_next_pages():
-                if nxt not in seen_listing_pages:
-                    to_visit.append(nxt)
+                return []
+            finally:
+                tabs.put_nowait(tab)
+            all_vehicle_links.update(links)
+            return next_pages
+
+        # breadth-first over real pagination links only; every page of one round loads concurrently
+        frontier = [INV_URL]
+        while frontier:
+            batch = [u for u in dict.fromkeys(frontier) if u not in seen_listing_pages]
+            seen_listing_pages.update(batch)
+            while n_tabs < min(LISTING_TABS, len(batch)):
+                tabs.put_nowait(await context.new_page())
+                n_tabs += 1
+            frontier = [nxt for found in await asyncio.gather(*(visit(u) for u in batch)) for nxt in found]
+            if stop_after_first_page and stop_after_first_page(set(all_vehicle_links)):
+                return sorted(all_vehicle_links)
+            stop_after_first_page = None
+
+        # no linkable pagination (JS-driven "Next" button): click through until it stops yielding cars
+        if len(seen_listing_pages) == 1:
+            for _ in range(50):
+                nxt = page.locator("a,button", has_text=NEXT_TEXT_RE).first
+                try:
+                    if not await nxt.is_visible():
+                        break
+                    await nxt.click(timeout=10000)
+                    await page.wait_for_load_state("domcontentloaded")
+                except Exception:
+                    break
+                await load_lazy_items(page)
+                links, _ = await harvest_listing_page(page)
+                if links <= all_vehicle_links:
+                    break
+                all_vehicle_links |= links
 
         return sorted(all_vehicle_links)
     finally:
-        await browser.close()
+        await context.close()
 
 # ----------------------------
-# Scrape detail pages (DOM + JSON; also collects price from JSON)
+# Static fast path: plain HTTP for server-rendered detail pages
 # ----------------------------
-async def scrape_today() -> list:
-    async with async_playwright() as pw:
-        urls = await collect_vehicle_urls(pw)
+def _open_specs_cache(path: Path = SPECS_CACHE):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    db = sqlite3.connect(path)
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS specs ("
+        "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, fetched_at TEXT,"
+        "year TEXT, make TEXT, model TEXT, vin TEXT, price TEXT, canonical TEXT)"
+    )
+    return db
+
+async def fetch_static(urls: list, revalidate: bool = True, pool=None) -> dict:
+    """GET every URL without a browser; return {url: specs} for pages whose raw HTML already yields a VIN.
+
+    With `revalidate=False` cached validators are ignored: every page is downloaded and re-parsed,
+    and the cache is refreshed from the result. `pool` is the executor pages are parsed in.
+    """
+    found = {}
+    db = _open_specs_cache()
+    # url -> (etag, last_modified, year, make, model, vin, price, canonical) from earlier runs
+    cached = {
+        row[0]: row[1:]
+        for row in db.execute("SELECT url, etag, last_modified, year, make, model, vin, price, canonical FROM specs")
+    } if revalidate else {}
+    fresh, revalidated = [], []
+    now_dt = datetime.datetime.now(datetime.timezone.utc)
+    now = now_dt.isoformat(timespec="seconds")
+    limits = httpx.Limits(max_connections=STATIC_CONNECTIONS)
+    timeout = httpx.Timeout(20, pool=None)  # queued requests wait for a free connection, they don't fail
+    # HTTP/2 multiplexes any number of streams over one connection, so Limits alone doesn't cap requests
+    in_flight = asyncio.Semaphore(STATIC_CONNECTIONS)
+    try:
+        async with httpx.AsyncClient(
+            http2=True, limits=limits, timeout=timeout, headers=HTTP_HEADERS, follow_redirects=True
+        ) as client:
+
+            async def fetch(u):
+                # revalidate yesterday's result: an unchanged page answers 304 with no body to download or parse
+                hit = cached.get(u)
+                headers = {}
+                if hit and hit[0]:
+                    headers["If-None-Match"] = hit[0]
+                if hit and hit[1]:
+                    headers["If-Modified-Since"] = hit[1]
+                try:
+                    async with in_flight:
+                        resp = await client.get(u, headers=headers)
+                    if not _same_page(str(resp.url), u):
+                        return  # redirected away (sold car -> /inventory/): whatever VIN is there is another car's
+                    if resp.status_code == 304 and hit:
+                        year, make, model, vin, price, canonical = hit[2:]
+                        found[u] = {"year": year, "make": make, "model": model, "vin": vin, "price": price, "url": canonical}
+                        revalidated.append((now, u))
+                        return
+                    resp.raise_for_status()
+                    specs = await _parse_off_loop(pool, resp.text, url_hint=u, require_vin=True)
+                except Exception:
+                    return  # this URL only (bad URL, HTTP error, parse failure): the browser pass retries it
+                if specs["vin"] and _is_detail_url(specs["url"]):
+                    found[u] = specs
+                    etag, modified = resp.headers.get("etag"), resp.headers.get("last-modified")
+                    if etag or modified:
+                        fresh.append((u, etag, modified, now, *(specs[k] for k in ("year", "make", "model", "vin", "price", "url"))))
+
+            await asyncio.gather(*(fetch(u) for u in urls))
+        db.executemany("INSERT OR REPLACE INTO specs VALUES (?,?,?,?,?,?,?,?,?,?)", fresh)
+        db.executemany("UPDATE specs SET fetched_at = ? WHERE url = ?", revalidated)
+        # cars that left the inventory stop being fetched; expire them so the cache stays bounded
+        cutoff = (now_dt - datetime.timedelta(days=SPECS_CACHE_DAYS)).isoformat(timespec="seconds")
+        db.execute("DELETE FROM specs WHERE fetched_at < ?", (cutoff,))
+        db.commit()
+    finally:
+        db.close()
+    return found
 
-        rows = []
-        browser = await pw.chromium.launch()
+# ----------------------------
+# Scrape detail pages (static first; Playwright DOM + JSON for the JS-gated rest)
+# ----------------------------
+# Detail page is ready once a VIN-shaped token is in its JSON-LD or rendered text; a bare ld+json
+# tag is not enough, since JS shells ship the dealer-wide Organization block before the car renders
+SPECS_READY_JS = """() => /\\b[A-HJ-NPR-Z0-9]{17}\\b/.test(
+    Array.from(document.querySelectorAll('script[type*="ld+json"]'), s => s.textContent).join(' ')
+    + ' ' + (document.body ? document.body.innerText : ''))"""
+
+async def _capture_json(page_vins: dict, page_prices: dict, resp):
+    """Response listener for one detail-page visit: VINs (in arrival order) and VIN -> price from its XHR JSON."""
+    try:
+        ct = (resp.headers or {}).get("content-type", "")
+    except Exception:
+        ct = ""
+    url = resp.url.lower()
+    if ("application/json" not in ct) or not any(k in url for k in ["/inventory", "vehicle", "listing", "stock"]):
+        return
+    try:
+        body = await resp.body()
+    except Exception:
+        return
+    # flat scans over the raw bytes: no JSON decode and no Python-level walk of the tree
+    vins = [(m.start(), m.group(1).decode()) for m in JSON_VIN_RE.finditer(body)]
+    prices = [(m.start(), m.group(1).decode()) for m in JSON_PRICE_RE.finditer(body)]
+    for _, v in vins:
+        page_vins[v] = None
+    price_pos = [p_pos for p_pos, _ in prices]
+    for pos, v in vins:
+        # nearest price key in the same object: no brace between the two matches. Both lists are in
+        # offset order, so only the price just before and just after the VIN can qualify (any farther
+        # one crosses the same span); find() checks the span without copying it
+        same_obj = []
+        j = bisect.bisect(price_pos, pos)
+        for k in (j - 1, j):
+            if 0 <= k < len(prices):
+                lo, hi = sorted((pos, price_pos[k]))
+                if body.find(b"{", lo, hi) < 0 and body.find(b"}", lo, hi) < 0:
+                    same_obj.append((hi - lo, prices[k][1]))
+        if same_obj:
+            raw = min(same_obj)[1]
+        elif len(vins) == 1 and prices:
+            raw = prices[0][1]  # a single vehicle: its price may sit in a nested object
+        else:
+            continue
+        p = _clean_price(raw)
+        if p:
+            page_prices.setdefault(v, p)
+
+async def scrape_details(browser, urls: list, static: dict, pool=None) -> list:
+    """Rows for `urls`: static-fetch results where available, the context pool on `browser` for the rest."""
+    # url index -> specs, so output order follows `urls` whichever path/worker finished first;
+    # VINs are de-duped as rows arrive (the first page to report a VIN keeps it)
+    results = {}
+    seen_vins = set()
+
+    def keep(i, specs):
+        v = specs["vin"]
+        if v and v not in seen_vins:
+            seen_vins.add(v)
+            results[i] = specs
+
+    for i, u in enumerate(urls):
+        if u in static:
+            keep(i, static[u])
+
+    async def scrape_one(page, i, u):
+        # JSON signals are scoped to this visit so nothing leaks onto later, unrelated pages
+        page_vins, page_prices = {}, {}
+        handler = functools.partial(_capture_json, page_vins, page_prices)
+        page.on("response", handler)
         try:
-            page = await browser.new_page()
+            await page.goto(u, wait_until="domcontentloaded", timeout=60000)
+            if not _same_page(page.url, u):
+                return  # redirected away (sold car -> /inventory/): don't credit this URL with another car's VIN
+            try:
+                # proceed as soon as JSON-LD or a VIN-shaped token is on the page, not after a fixed sleep
+                await page.wait_for_function(SPECS_READY_JS, timeout=8000)
+            except Exception:
+                pass  # extract whatever rendered
 
-            json_vins   = set()
-            json_prices = dict()  # map VIN -> price
+            html = await page.content()
+            specs = await _parse_off_loop(pool, html, url_hint=u)
 
-            async def handle_response(resp):
-                try:
-                    ct = (resp.headers or {}).get("content-type", "")
-                except Exception:
-                    ct = ""
-                url = resp.url.lower()
-                if ("application/json" not in ct) or not any(k in url for k in ["/inventory", "vehicle", "listing", "stock"]):
-                    return
-                try:
-                    data = await resp.json()
-                except Exception:
-                    return
-                stack = [data]
-                while stack:
-                    cur = stack.pop()
-                    if isinstance(cur, dict):
-                        for _, v in cur.items():
-                            if isinstance(v, (dict, list)):
-                                stack.append(v)
-                            elif isinstance(v, str):
-                                s = v.strip()
-                                if VIN_RE.fullmatch(s):
-                                    vin = s.upper()
-                                    json_vins.add(vin)
-                                    # keep last known price for this vin if seen later
-                                else:
-                                    p = _clean_price(s)
-                                    if p and json_vins:
-                                        for vv in list(json_vins):
-                                            json_prices.setdefault(vv, p)
-                    elif isinstance(cur, list):
-                        stack.extend(cur)
-
-            # register handler correctly
-            page.on("response", lambda r: asyncio.create_task(handle_response(r)))
-
-            for u in urls:
+            # rendered text is only worth a round-trip when the DOM alone gave no VIN
+            if not specs["vin"]:
                 try:
-                    await page.goto(u, wait_until="networkidle", timeout=60000)
-                    await page.wait_for_timeout(600)
-
-                    html = await page.content()
-                    try:
-                        body_text = await page.evaluate("document.body.innerText")
-                        if body_text:
-                            html += "\n" + body_text
-                    except Exception:
-                        pass
-
-                    specs = extract_specs_from_html(html, url_hint=u)
-
-                    # backfill from JSON if needed
-                    if not specs["vin"] and json_vins:
-                        used = {r["vin"] for r in rows if r.get("vin")}
-                        for v in json_vins:
-                            if v not in used:
-                                specs["vin"] = v
-                                break
-                    if specs["vin"] and not specs["price"]:
-                        p = json_prices.get(specs["vin"], "")
-                        if p:
-                            specs["price"] = p
-
-                    if specs["vin"]:
-                        rows.append(specs)
+                    body_text = await page.evaluate("document.body.innerText")
                 except Exception:
-                    pass
+                    body_text = None
+                if body_text:
+                    specs = await _parse_off_loop(pool, html, url_hint=u, extra_text=body_text)
+
+            # backfill from JSON if needed
+            if not specs["vin"] and page_vins:
+                for v in page_vins:
+                    if v not in seen_vins:
+                        specs["vin"] = v
+                        break
+            if specs["vin"] and not specs["price"]:
+                p = page_prices.get(specs["vin"], "")
+                if p:
+                    specs["price"] = p
+
+            if _is_detail_url(specs["url"]):  # canonical pointing at a listing/landing page: not this car
+                keep(i, specs)
+        except Exception:
+            pass
         finally:
-            await browser.close()
+            page.remove_listener("response", handler)
 
-        # de-dupe by VIN
-        uniq = {}
-        for r in rows:
-            v = r.get("vin", "")
-            if v and v not in uniq:
-                uniq[v] = r
-        return list(uniq.values())
+    async def worker(context, queue):
+        try:
+            page = await context.new_page()
+        except Exception:
+            return  # this worker is out; the others drain its share of the queue
+        while True:
+            try:
+                i, u = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            await scrape_one(page, i, u)
+
+    # only pages the static fetch couldn't resolve need a real browser
+    queue = asyncio.Queue()
+    for i, u in enumerate(urls):
+        if u not in static:
+            queue.put_nowait((i, u))
+
+    # one context per worker; all of them drain the same queue
+    contexts = [await browser.new_context() for _ in range(min(DETAIL_WORKERS, queue.qsize()))]
+    try:
+        for ctx in contexts:
+            await ctx.route("**/*", _block_heavy_resources)
+        await asyncio.gather(*(worker(ctx, queue) for ctx in contexts))
+    finally:
+        for ctx in contexts:
+            await ctx.close()
+
+    return [results[i] for i in sorted(results)]
+
+async def scrape_today(force: bool = False) -> list:
+    # one Chromium for both phases: no second cold start, and the dealer connections stay warm
+    async with async_playwright() as pw:
+        browser = await pw.chromium.launch(args=CHROMIUM_ARGS)
+        try:
+            sitemap = set(await fetch_sitemap_urls())
+
+            def sitemap_is_current(newest: set) -> bool:
+                # the sitemap must already list every car on the listing's first (newest) page. This only
+                # shows it was regenerated after the latest arrivals; sold cars it still lists are caught
+                # per page (redirected or non-detail responses are rejected in fetch_static/scrape_details)
+                return bool(newest) and newest <= sitemap
+
+            # the first listing page is loaded once either way: it is the freshness check, and the
+            # first page of the crawl when the check fails
+            crawled = await collect_vehicle_urls(browser, stop_after_first_page=sitemap_is_current if sitemap else None)
+            urls = sorted(sitemap) if sitemap and crawled and set(crawled) <= sitemap else crawled
+            urls = _dedupe_by_listing_id(urls)
+            # parsing is CPU-bound: a process pool keeps it off the event loop and spreads it across cores
+            # forkserver: by now httpx has started asyncio's resolver threads, and forking a threaded process can deadlock
+            with ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=multiprocessing.get_context("forkserver")) as pool:
+                static = await fetch_static(urls, revalidate=not force, pool=pool)
+                return await scrape_details(browser, urls, static, pool=pool)
+        finally:
+            await browser.close()
 
 # ----------------------------
 # IO / diff / rollup (price-change aware)
 # ----------------------------
+def latest_snapshot(out_dir: Path):
+    """Newest inventory snapshot; the Parquet copy wins over the CSV written the same day."""
+    snaps = {p.stem: p for p in out_dir.glob("inventory_*.csv")}
+    snaps.update({p.stem: p for p in out_dir.glob("inventory_*.parquet")})
+    return snaps[max(snaps)] if snaps else None
+
 def load_prev_inventory(path: str) -> pd.DataFrame:
     required_cols = ["date", "year", "make", "model", "vin", "price", "url"]
-    if Path(path).exists():
+    if Path(path).suffix == ".parquet" and Path(path).exists():
+        # written as string dtype (no NaN to fill); back to object so prev mixes with today's frame the
+        # way a CSV-loaded snapshot does (StringDtype next to an empty object frame warns in pd.concat)
+        prev = pd.read_parquet(path, engine="pyarrow").astype(object)
+    elif Path(path).exists():
         prev = pd.read_csv(path, dtype=str).fillna("")
     else:
         prev = pd.DataFrame(columns=required_cols)
@@ -315,44 +715,56 @@ def load_prev_inventory(path: str) -> pd.DataFrame:
 def rollup(df: pd.DataFrame) -> pd.DataFrame:
     if df.empty:
         return pd.DataFrame(columns=["year","make","model","count","vins"])
-    return (
-        df.groupby(["year","make","model"], dropna=False)["vin"]
-          .agg(count="count", vins=lambda v: ", ".join(sorted(set(v))))
-          .reset_index()
-          .sort_values(["year","make","model"])
-          .reset_index(drop=True)
+    # sort once up front: groups then come out in key order and each group's VINs are already sorted
+    # the keys are low-cardinality strings: group on categorical codes instead of re-hashing
+    # every string, and observed=True skips unused category combinations
+    df = df.astype({"year": "category", "make": "category", "model": "category"}).sort_values(["year","make","model","vin"])
+    keys = ["year","make","model"]
+    counts = df.groupby(keys, sort=False, dropna=False, observed=True)["vin"].size().rename("count")
+    # de-dupe VINs once, frame-wide, so the per-group step is a bare join
+    vins = (
+        df.drop_duplicates(keys + ["vin"])
+          .groupby(keys, sort=False, dropna=False, observed=True)["vin"]
+          .agg(", ".join)
+          .rename("vins")
     )
+    return pd.concat([counts, vins], axis=1).reset_index()
 
 def main():
+    parser = argparse.ArgumentParser(description="Scrape Carbox inventory and diff it against the last snapshot.")
+    parser.add_argument("--force", action="store_true", help="ignore the spec cache and re-parse every detail page")
+    args = parser.parse_args()
+
     today = datetime.date.today().isoformat()
     out_dir = Path("reports")
     out_dir.mkdir(exist_ok=True)
 
     # previous snapshot (if any)
-    prev_files = sorted(out_dir.glob("inventory_*.csv"))
-    prev_path  = prev_files[-1] if prev_files else None
+    prev_path  = latest_snapshot(out_dir)
     prev       = load_prev_inventory(prev_path) if prev_path else pd.DataFrame(columns=["date","year","make","model","vin","price","url"])
 
     # scrape
-    rows = asyncio.run(scrape_today())
+    rows = (uvloop.run if uvloop else asyncio.run)(scrape_today(force=args.force))
     df = pd.DataFrame(rows).drop_duplicates(subset=["vin"]).fillna("")
     if "price" not in df.columns:
         df["price"] = ""
     df["price"] = df["price"].astype(str).str.replace(r"[^0-9]", "", regex=True)
     df.insert(0, "date", today)
 
-    # write today's snapshot
-    (out_dir / f"inventory_{today}.csv").write_text(df.to_csv(index=False))
+    # write today's snapshot: Parquet is what the next run loads, the CSV stays for humans
+    df.astype("string").to_parquet(out_dir / f"inventory_{today}.parquet", engine="pyarrow", compression="zstd", index=False)
+    df.to_csv(out_dir / f"inventory_{today}.csv", index=False)
 
     # compute adds/removes
     if prev.empty:
         added = df.copy()
         removed = pd.DataFrame(columns=df.columns)
     else:
-        prev_vins = set(prev["vin"])
-        curr_vins = set(df["vin"])
-        added   = df[df["vin"].isin(curr_vins - prev_vins)].copy()
-        removed = prev[prev["vin"].isin(prev_vins - curr_vins)].copy()
+        # hashed set difference on the VIN indexes, kept in snapshot order
+        prev_idx = pd.Index(prev["vin"])
+        curr_idx = pd.Index(df["vin"])
+        added   = df.set_index("vin").loc[curr_idx.difference(prev_idx, sort=False)].reset_index()[df.columns]
+        removed = prev.set_index("vin").loc[prev_idx.difference(curr_idx, sort=False)].reset_index()[prev.columns]
 
     # compute price changes
     price_changes = pd.DataFrame(columns=["date","vin","year","make","model","old_price","new_price","delta","url"])
@@ -363,30 +775,29 @@ def main():
             on="vin", how="inner", suffixes=("_old","_new")
         )
 
-        def to_int(s):
-            try:
-                return int(str(s).replace(",","").strip())
-            except Exception:
-                return None
-
-        changed = []
-        for _, r in merged.iterrows():
-            old = to_int(r["price_old"])
-            new = to_int(r["price_new"])
-            if old is not None and new is not None and old != new:
-                changed.append({
-                    "date": today,
-                    "vin": r["vin"],
-                    "year": r["year_new"] or r["year_old"],
-                    "make": (r["make_new"] or r["make_old"]).upper(),
-                    "model": (r["model_new"] or r["model_old"]).upper(),
-                    "old_price": str(old),
-                    "new_price": str(new),
-                    "delta": str(new - old),
-                    "url": r["url_new"] or r["url_old"]
-                })
-        if changed:
-            price_changes = pd.DataFrame(changed)
+        def to_num(col):
+            return pd.to_numeric(merged[col].astype(str).str.replace(",", "", regex=False).str.strip(), errors="coerce")
+
+        def newer(col):
+            return merged[f"{col}_new"].where(merged[f"{col}_new"] != "", merged[f"{col}_old"])
+
+        old = to_num("price_old")
+        new = to_num("price_new")
+        mask = old.notna() & new.notna() & (old != new)
+        if mask.any():
+            old = old[mask].astype("int64")
+            new = new[mask].astype("int64")
+            price_changes = pd.DataFrame({
+                "date": today,
+                "vin": merged.loc[mask, "vin"],
+                "year": newer("year")[mask],
+                "make": newer("make")[mask].str.upper(),
+                "model": newer("model")[mask].str.upper(),
+                "old_price": old.astype(str),
+                "new_price": new.astype(str),
+                "delta": (new - old).astype(str),
+                "url": newer("url")[mask],
+            }).reset_index(drop=True)
 
     # write rollups + delta + price changes
     rollup(added).to_csv(out_dir / f"added_by_group_{today}.csv",     index=False)